@@ -1,12 +1,22 @@
 import os
+import tempfile
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from .utils import get_client_ip
-db = SQLAlchemy()
-migrate = Migrate()
+from werkzeug.middleware.proxy_fix import ProxyFix
+from .utils import get_client_ip, parse_limits
+from .passwords import PasswordHashingOverloaded
+from .metrics import init_metrics
+from .startup import init_startup, report_startup
+from .routing import RoutingSession, engine_options, init_routing, replica_binds
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
-def create_app() -> Flask:
+DEFAULT_RATE_LIMITS = (
+    "auth.login=10/60,auth.register=5/3600,"
+    "images.images_upload=30/60,images.images_upload_url=30/60,images.images_upload_confirm=30/60,"
+    "images.unlock_location=10/60"
+)
+
+def create_app(migrations: bool = True) -> Flask:
     app = Flask(__name__)
 
     app.config["SECRET_KEY"] = os.environ["FLASK_SECRET_KEY"]
@@ -17,21 +27,96 @@ def create_app() -> Flask:
 
     app.config["SQLALCHEMY_DATABASE_URI"] = db_url
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 10))
+    app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    app.config["DB_PGBOUNCER"] = os.environ.get("DB_PGBOUNCER", "0") == "1"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    replica_urls = [url for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url]
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(replica_urls, app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+    app.config["REPLICA_STICKY_SECONDS"] = float(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+
+    app.config["APP_VERSION"] = os.environ.get("APP_VERSION", "dev")
 
     app.config["AWS_REGION"] = os.environ["AWS_REGION"]
     app.config["S3_BUCKET_NAME"] = os.environ["S3_BUCKET_NAME"]
+    app.config["S3_MAX_POOL_CONNECTIONS"] = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 50))
+    app.config["S3_PRESIGN_WINDOW"] = int(os.environ.get("S3_PRESIGN_WINDOW", 3600))
+    app.config["S3_PRESIGN_CACHE_SIZE"] = int(os.environ.get("S3_PRESIGN_CACHE_SIZE", 10000))
+    app.config["DIRECT_UPLOADS"] = os.environ.get("DIRECT_UPLOADS", "0") == "1"
+    app.config["DIRECT_UPLOAD_EXPIRES"] = int(os.environ.get("DIRECT_UPLOAD_EXPIRES", 600))
+    app.config["MAX_UPLOAD_BYTES"] = int(os.environ.get("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+    app.config["BAN_REFRESH_INTERVAL"] = float(os.environ.get("BAN_REFRESH_INTERVAL", 5))
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    app.config["PASSWORD_HASH_QUEUE"] = int(os.environ.get("PASSWORD_HASH_QUEUE", 32))
+    app.config["PASSWORD_HASH_QUEUE_TIMEOUT"] = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", 0.2))
+    app.config["SESSION_BACKEND"] = os.environ.get("SESSION_BACKEND", "sql")
+    app.config["SESSION_CACHE_SIZE"] = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+    app.config["SESSION_CACHE_TTL"] = float(os.environ.get("SESSION_CACHE_TTL", 300))
+    app.config["UNLOCK_TTL"] = int(os.environ.get("UNLOCK_TTL", 24 * 3600))
+    app.config["UNLOCKED_IMAGES_MAX"] = int(os.environ.get("UNLOCKED_IMAGES_MAX", 1000))
+    app.config["PRINCIPAL_CACHE_TTL"] = float(os.environ.get("PRINCIPAL_CACHE_TTL", 30))
+    app.config["PRINCIPAL_CACHE_SIZE"] = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 1024))
+    app.config["THUMBNAIL_WIDTHS"] = [int(w) for w in os.environ.get("THUMBNAIL_WIDTHS", "300,600").split(",")]
+    app.config["THUMBNAIL_QUALITY"] = int(os.environ.get("THUMBNAIL_QUALITY", 80))
+    app.config["JOB_POLL_INTERVAL"] = float(os.environ.get("JOB_POLL_INTERVAL", 1))
+    app.config["JOB_MAX_ATTEMPTS"] = int(os.environ.get("JOB_MAX_ATTEMPTS", 8))
+    app.config["ADMIN_PAGE_SIZE"] = int(os.environ.get("ADMIN_PAGE_SIZE", 50))
+    app.config["SLOW_REQUEST_SECONDS"] = float(os.environ.get("SLOW_REQUEST_SECONDS", 0))
+    app.config["IMAGES_PAGE_SIZE"] = int(os.environ.get("IMAGES_PAGE_SIZE", 20))
+    app.config["FRAGMENT_CACHE_SIZE"] = int(os.environ.get("FRAGMENT_CACHE_SIZE", 5000))
+    app.config["UPLOAD_ROOT"] = os.environ.get("UPLOAD_ROOT")
+    app.config["RAW_CACHE_MAX_BYTES"] = int(os.environ.get("RAW_CACHE_MAX_BYTES", 1024 ** 3))
+    app.config["RATE_LIMIT_BACKEND"] = os.environ.get("RATE_LIMIT_BACKEND", "shm")
+    app.config["RATE_LIMITS"] = parse_limits(os.environ.get("RATE_LIMITS", DEFAULT_RATE_LIMITS))
+    app.config["RATE_LIMIT_SHM_PATH"] = os.environ.get(
+        "RATE_LIMIT_SHM_PATH",
+        os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "pictapp-ratelimit"),
+    )
+    app.config["RATE_LIMIT_SLOTS"] = int(os.environ.get("RATE_LIMIT_SLOTS", 65536))
+    app.config["TRUSTED_PROXY_HOPS"] = int(os.environ.get("TRUSTED_PROXY_HOPS", 1))
+    app.config["TRENDING_WINDOW_HOURS"] = int(os.environ.get("TRENDING_WINDOW_HOURS", 24))
+    app.config["TRENDING_HALF_LIFE_HOURS"] = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", 6))
+    app.config["TRENDING_REFRESH_SECONDS"] = float(os.environ.get("TRENDING_REFRESH_SECONDS", 60))
+    app.config["TRENDING_SIZE"] = int(os.environ.get("TRENDING_SIZE", 50))
+    app.config["STARTUP_BUDGET_SECONDS"] = float(os.environ.get("STARTUP_BUDGET_SECONDS", 1.0))
+
+    if app.config["TRUSTED_PROXY_HOPS"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXY_HOPS"])
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    if migrations:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    init_metrics(app)
+    init_routing(app)
+    init_startup(app)
 
-    from .models import User, Image, Like, Banned
+    from .models import User, Image, Like, Banned, Counter, Job
     from .auth import auth_routes
     from .images import image_routes
     from .admin import admin_routes
+    from .api import api_routes
+    from .jobs import jobs_cli
+    from . import thumbnails, outbox
+    from .sessions import SqlSessionInterface
+    from .ratelimit import init_rate_limits
 
     app.register_blueprint(auth_routes)
     app.register_blueprint(image_routes)
     app.register_blueprint(admin_routes)
+    app.register_blueprint(api_routes)
+    app.cli.add_command(jobs_cli)
+    init_rate_limits(app)
+
+    if app.config["SESSION_BACKEND"] == "sql":
+        app.session_interface = SqlSessionInterface(app.config["SESSION_CACHE_SIZE"], app.config["SESSION_CACHE_TTL"])
+
+    @app.errorhandler(PasswordHashingOverloaded)
+    def password_hashing_overloaded(_e):
+        return "Server is busy, please try again shortly", 503, {"Retry-After": "1"}
 
     @app.route("/health")
     def health():
@@ -39,23 +124,20 @@ def create_app() -> Flask:
 
     @app.before_request
     def check_banned():
-        from flask import session, request, redirect
-        from .models import Banned
+        from flask import request, redirect
+        from .bans import ban_index
+        from .principal import current_user
 
         if request.endpoint in ("auth.login", "auth.logout", "auth.register", "static", "admin.admin_index"):
             return None
-        
-        user_id = session.get("user_id")
-        if user_id:
-            user = User.query.get(user_id)
-            if user and user.username == "admin":
-                return None
-        
-        ip = get_client_ip()
-
-        if Banned.query.filter_by(ip=ip).first():
-            return redirect("https://zakon.rada.gov.ua/laws/show/2341-14/conv/paran1661#n1661")
-
-        return None
+
+        if not ban_index.is_banned(get_client_ip()):
+            return None
+
+        user = current_user()
+        if user and user.is_admin:
+            return None
+
+        return redirect("https://zakon.rada.gov.ua/laws/show/2341-14/conv/paran1661#n1661")
 
     return app
\ No newline at end of file
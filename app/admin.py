@@ -1,32 +1,80 @@
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request
-from .models import User, Banned
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from sqlalchemy import cast
+from sqlalchemy.dialects.postgresql import INET
+from .models import User, Banned, bump_counter
 from . import db
+from .bans import ban_index, parse_address, parse_network, BANS_COUNTER
+from .principal import current_user
+from .routing import read_replica
 
 admin_routes = Blueprint("admin", __name__, url_prefix="/admin")
 
 def is_admin():
-    user_id = session.get("user_id")
-    if not user_id:
-        return False
-    user = User.query.get(user_id)
-    return user and user.username == "admin"
+    user = current_user()
+    return bool(user and user.is_admin)
+
+def ip_search(ip_filter: str):
+    if "/" in ip_filter:
+        try:
+            return User.last_inet.op("<<=")(cast(str(parse_network(ip_filter)), INET))
+        except ValueError:
+            pass
+    else:
+        try:
+            return User.last_inet == cast(str(parse_address(ip_filter)), INET)
+        except ValueError:
+            pass
+    prefix = ip_filter.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return User.last_ip.like(f"{prefix}%", escape="\\")
 
 @admin_routes.get("/")
+@read_replica
 def admin_index():
     if not is_admin():
         return redirect(url_for("auth.login"))
 
-    ip_filter = request.args.get("ip", None)
+    ip_filter = (request.args.get("ip") or "").strip()
+    after = request.args.get("after", 0, type=int)
+    page_size = current_app.config["ADMIN_PAGE_SIZE"]
+
+    query = db.session.query(User, Banned.id.isnot(None)).outerjoin(Banned, Banned.ip == User.last_ip)
     if ip_filter:
-        users = User.query.filter(User.last_ip.like(f"%{ip_filter}%")).all()
-    else:
-        users = User.query.order_by(User.id.asc()).all()
+        query = query.filter(ip_search(ip_filter))
+    rows = query.filter(User.id > after).order_by(User.id.asc()).limit(page_size + 1).all()
 
-    banned_ips = {b.ip for b in Banned.query.filter(Banned.ip.isnot(None)).all()}
-    for user in users:
-        user.is_banned = user.last_ip in banned_ips
+    next_after = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_after = rows[-1][0].id
 
-    return render_template("admin.html", users=users)
+    users = []
+    for user, exact_ban in rows:
+        user.is_banned = exact_ban or ban_index.is_banned(user.last_ip)
+        users.append(user)
+
+    return render_template("admin.html", users=users, ip_filter=ip_filter, after=after, next_after=next_after)
+
+@admin_routes.get("/bans")
+@read_replica
+def admin_bans():
+    if not is_admin():
+        return redirect(url_for("auth.login"))
+
+    after = request.args.get("after", 0, type=int)
+    page_size = current_app.config["ADMIN_PAGE_SIZE"]
+    bans = (
+        Banned.query.filter(Banned.ip.isnot(None), Banned.id > after)
+        .order_by(Banned.id.asc())
+        .limit(page_size + 1)
+        .all()
+    )
+
+    next_after = None
+    if len(bans) > page_size:
+        bans = bans[:page_size]
+        next_after = bans[-1].id
+
+    return render_template("admin_bans.html", bans=bans, after=after, next_after=next_after)
 
 @admin_routes.post("/ban/<int:user_id>")
 def admin_ban_user(user_id):
@@ -48,7 +96,9 @@ def admin_ban_user(user_id):
 
     ban = Banned(ip=user.last_ip)
     db.session.add(ban)
+    bump_counter(BANS_COUNTER)
     db.session.commit()
+    ban_index.invalidate()
 
     flash(f"User {user.username} banned by IP {user.last_ip}")
     return redirect(url_for("admin.admin_index"))
@@ -66,9 +116,55 @@ def admin_unban_user(user_id):
     banned_entry = Banned.query.filter_by(ip=user.last_ip).first()
     if banned_entry:
         db.session.delete(banned_entry)
+        bump_counter(BANS_COUNTER)
         db.session.commit()
+        ban_index.invalidate()
         flash("User unbanned successfully")
+    elif ban_index.is_banned(user.last_ip):
+        flash("User is banned by a network ban")
     else:
         flash("User was not banned")
 
     return redirect(url_for("admin.admin_index"))
+
+@admin_routes.post("/ban-network")
+def admin_ban_network():
+    if not is_admin():
+        return redirect(url_for("auth.login"))
+
+    try:
+        network = parse_network(request.form.get("network") or "")
+    except ValueError:
+        flash("Invalid IP network")
+        return redirect(url_for("admin.admin_bans"))
+
+    value = str(network.network_address) if network.prefixlen == network.max_prefixlen else str(network)
+    if Banned.query.filter_by(ip=value).first():
+        flash("Network already banned")
+        return redirect(url_for("admin.admin_bans"))
+
+    db.session.add(Banned(ip=value))
+    bump_counter(BANS_COUNTER)
+    db.session.commit()
+    ban_index.invalidate()
+
+    flash(f"Network {value} banned")
+    return redirect(url_for("admin.admin_bans"))
+
+@admin_routes.post("/unban-network/<int:ban_id>")
+def admin_unban_network(ban_id):
+    if not is_admin():
+        return redirect(url_for("auth.login"))
+
+    banned_entry = Banned.query.get(ban_id)
+    if not banned_entry:
+        flash("Ban not found")
+        return redirect(url_for("admin.admin_bans"))
+
+    db.session.delete(banned_entry)
+    bump_counter(BANS_COUNTER)
+    db.session.commit()
+    ban_index.invalidate()
+
+    flash(f"Network {banned_entry.ip} unbanned")
+    return redirect(url_for("admin.admin_bans"))
@@ -0,0 +1,67 @@
+import orjson
+from flask import Blueprint, current_app, request, session
+from . import db
+from .images import liked_image_ids
+from .models import Image, User
+from .routing import read_replica
+from .storage import presigned_url
+from .utils import keyset_page, unlocked_image_ids
+
+api_routes = Blueprint("api", __name__, url_prefix="/api")
+
+MAX_PAGE_SIZE = 100
+
+IMAGE_FIELDS = {
+    "id": lambda img, ctx: img.id,
+    "user_id": lambda img, ctx: img.user_id,
+    "created_at": lambda img, ctx: img.created_at,
+    "description": lambda img, ctx: img.description,
+    "location": lambda img, ctx: None if img.location_is_hidden and img.id not in ctx["unlocked"] else img.location,
+    "location_is_hidden": lambda img, ctx: bool(img.location_is_hidden),
+    "likes_count": lambda img, ctx: img.likes_count,
+    "liked": lambda img, ctx: img.id in ctx["liked"],
+    "url": lambda img, ctx: presigned_url(img.stored_filename),
+    "thumbnails": lambda img, ctx: {w: presigned_url(key) for w, key in (img.thumbnail_keys or {}).items()},
+}
+
+def json_response(payload, status: int = 200):
+    return current_app.response_class(orjson.dumps(payload), status=status, mimetype="application/json")
+
+def image_page(query, **extra):
+    fields = [name for name in request.args.get("fields", "").split(",") if name] or list(IMAGE_FIELDS)
+    unknown = [name for name in fields if name not in IMAGE_FIELDS]
+    if unknown:
+        return json_response({"error": f"Unknown field(s): {', '.join(unknown)}"}, 400)
+
+    page_size = request.args.get("limit", current_app.config["IMAGES_PAGE_SIZE"], type=int)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    images, next_cursor = keyset_page(query, Image, request.args.get("cursor"), page_size)
+
+    ctx = {
+        "liked": liked_image_ids(int(session["user_id"]), [img.id for img in images]) if "liked" in fields else set(),
+        "unlocked": unlocked_image_ids(),
+    }
+    items = [{name: IMAGE_FIELDS[name](img, ctx) for name in fields} for img in images]
+    response = json_response({**extra, "images": items, "next_cursor": next_cursor})
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@api_routes.get("/images")
+@read_replica
+def api_images():
+    if not session.get("user_id"):
+        return json_response({"error": "Login required"}, 401)
+    return image_page(Image.query)
+
+@api_routes.get("/users/<int:user_id>/images")
+@read_replica
+def api_user_images(user_id: int):
+    if not session.get("user_id"):
+        return json_response({"error": "Login required"}, 401)
+
+    owner = db.session.get(User, user_id)
+    if owner is None:
+        return json_response({"error": "User not found"}, 404)
+
+    user = {"id": owner.id, "username": owner.username, "images_count": owner.images_count}
+    return image_page(Image.query.filter_by(user_id=owner.id), user=user)
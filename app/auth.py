@@ -1,11 +1,25 @@
 from flask import Blueprint, render_template, request, redirect, session, url_for, flash
-from werkzeug.security import generate_password_hash, check_password_hash
 from .models import User
 from . import db
 from .utils import require_login, get_client_ip
+from .principal import forget_principal
+from .bans import parse_address
+from .passwords import hasher
 
 auth_routes = Blueprint("auth", __name__)
 
+def inet_or_none(ip):
+    try:
+        return str(parse_address(ip)) if ip else None
+    except ValueError:
+        return None
+
+def start_session(user_id: int):
+    # A fresh session id on login, so an id planted before it never becomes authenticated.
+    if hasattr(session, "regenerate"):
+        session.regenerate()
+    session["user_id"] = user_id
+
 @auth_routes.get("/")
 def index():
     if session.get("user_id"):
@@ -33,11 +47,11 @@ def register():
             flash("Username already exists.")
             return render_template("register.html")
 
-        u = User(username=username, password_hash=generate_password_hash(password))
+        u = User(username=username, password_hash=hasher.hash(password))
         db.session.add(u)
         db.session.commit()
 
-        session["user_id"] = int(u.id)
+        start_session(int(u.id))
         return redirect(url_for("auth.profile"))
 
     return render_template("register.html")
@@ -49,14 +63,19 @@ def login():
         password = request.form.get("password") or ""
 
         u = User.query.filter_by(username=username).first()
-        if not u or not check_password_hash(u.password_hash, password):
+        if not u or not hasher.verify(u.password_hash, password):
             flash("Invalid credentials")
             return render_template("login.html")
 
+        if hasher.needs_rehash(u.password_hash):
+            u.password_hash = hasher.hash(password)
+
         u.last_ip = get_client_ip()
+        u.last_inet = inet_or_none(u.last_ip)
         db.session.commit()
+        forget_principal(u.id)
 
-        session["user_id"] = int(u.id)
+        start_session(int(u.id))
         return redirect(url_for("auth.profile"))
 
     return render_template("login.html")
@@ -0,0 +1,106 @@
+import ipaddress
+import threading
+import time
+from flask import current_app
+from .models import Banned, read_counter
+
+BANS_COUNTER = "bans"
+
+def parse_network(value: str):
+    network = ipaddress.ip_network(value.strip(), strict=False)
+    if network.version == 6 and network.network_address.ipv4_mapped and network.prefixlen >= 96:
+        mapped = network.network_address.ipv4_mapped
+        network = ipaddress.ip_network(f"{mapped}/{network.prefixlen - 96}", strict=False)
+    return network
+
+def parse_address(value: str):
+    address = ipaddress.ip_address(value.strip())
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+class PrefixTrie:
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = [None, None, False]
+
+    def insert(self, network):
+        node = self.root
+        value = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (value >> (self.bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        node[2] = True
+
+    def contains(self, address) -> bool:
+        node = self.root
+        value = int(address)
+        for i in range(self.bits):
+            if node[2]:
+                return True
+            node = node[(value >> (self.bits - 1 - i)) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+class BanIndex:
+    """In-process copy of the banned table.
+
+    Single addresses live in a set, CIDR ranges in one prefix trie per address
+    family. The index reloads when the shared ``bans`` counter moves, checked at
+    most every BAN_REFRESH_INTERVAL seconds per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0.0
+        self._raw = frozenset()
+        self._addresses = frozenset()
+        self._tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+
+    def invalidate(self):
+        self._next_check = 0.0
+
+    def is_banned(self, ip) -> bool:
+        if not ip:
+            return False
+        self._maybe_refresh()
+        if ip in self._raw:
+            return True
+        try:
+            address = parse_address(ip)
+        except ValueError:
+            return False
+        return address in self._addresses or self._tries[address.version].contains(address)
+
+    def _maybe_refresh(self):
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            version = read_counter(BANS_COUNTER)
+            if version != self._version:
+                self._load()
+                self._version = version
+            self._next_check = time.monotonic() + current_app.config["BAN_REFRESH_INTERVAL"]
+
+    def _load(self):
+        raw, addresses = set(), set()
+        tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        for (value,) in Banned.query.with_entities(Banned.ip).filter(Banned.ip.isnot(None)):
+            raw.add(value)
+            try:
+                network = parse_network(value)
+            except ValueError:
+                continue
+            if network.prefixlen == network.max_prefixlen:
+                addresses.add(network.network_address)
+            else:
+                tries[network.version].insert(network)
+        self._raw, self._addresses, self._tries = frozenset(raw), frozenset(addresses), tries
+
+ban_index = BanIndex()
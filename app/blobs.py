@@ -0,0 +1,70 @@
+import hashlib
+import uuid
+from flask import current_app
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+from . import db
+from .metrics import UPLOAD_DEDUP_HITS
+from .models import Blob
+from .storage import get_s3
+from .utils import CONTENT_TYPES
+
+CHUNK_SIZE = 1024 * 1024
+
+def sha256_of(stream) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def store_upload(f, ext: str) -> str:
+    """Return the S3 key holding the content of ``f``, uploading it only if
+    no earlier upload had the same SHA-256.
+
+    The blob row is claimed before the put and stays locked until the caller
+    commits, so a concurrent duplicate waits for this upload instead of
+    pointing at an object that is not there yet.
+    """
+    sha256 = sha256_of(f.stream)
+    new_key = f"{uuid.uuid4().hex}{ext}"
+    stmt = insert(Blob).values(key=new_key, sha256=sha256, refcount=1)
+    stmt = stmt.on_conflict_do_update(index_elements=[Blob.sha256], set_={"refcount": Blob.refcount + 1})
+    key = db.session.execute(stmt.returning(Blob.key)).scalar()
+    if key != new_key:
+        UPLOAD_DEDUP_HITS.inc()
+        return key
+
+    get_s3().upload_fileobj(
+        f.stream,
+        current_app.config["S3_BUCKET_NAME"],
+        key,
+        ExtraArgs={"ContentType": CONTENT_TYPES[ext]},
+    )
+    return key
+
+def claim_direct_upload(key: str) -> bool:
+    """Record a browser upload as a blob with one reference.
+
+    False when ``key`` was already claimed, so a replayed or concurrent
+    confirm of the same upload token cannot create a second image sharing
+    the object. Direct uploads are not hashed and keep a NULL sha256.
+    """
+    stmt = insert(Blob).values(key=key, refcount=1).on_conflict_do_nothing(index_elements=[Blob.key])
+    return db.session.execute(stmt.returning(Blob.key)).scalar() is not None
+
+def release_blob(key: str) -> bool:
+    """Drop one reference to ``key``; True when the S3 object should go.
+
+    Objects without a blob row (images stored before deduplication) have a
+    single owner and are always released.
+    """
+    refcount = db.session.execute(
+        update(Blob).where(Blob.key == key).values(refcount=Blob.refcount - 1).returning(Blob.refcount)
+    ).scalar()
+    if refcount is None:
+        return True
+    if refcount > 0:
+        return False
+    db.session.execute(delete(Blob).where(Blob.key == key))
+    return True
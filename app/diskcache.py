@@ -0,0 +1,114 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from flask import current_app
+from .storage import download_object
+from .utils import upload_root
+
+TOUCH_INTERVAL = 60
+EVICT_TO = 0.9
+
+class DiskLRUCache:
+    """Read-through cache of S3 objects on local disk, bounded by total size.
+
+    Recency is the file mtime, refreshed at most once a minute per hit. A miss
+    takes an exclusive flock on the key's lock file before downloading, so
+    concurrent misses for one key, in any thread or worker process sharing the
+    directory, fetch it from S3 once and the rest wait and reuse the file.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str) -> Path:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return self.root / name[:2] / name
+
+    def get(self, key: str):
+        """Return the local path of ``key``, or None if S3 does not have it."""
+        path = self.path_for(key)
+        if self._touch(path):
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_suffix(".lock"), "wb") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self._touch(path):
+                return path
+
+            fd, part = tempfile.mkstemp(dir=path.parent, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    if not download_object(key, out):
+                        return None
+                os.replace(part, path)
+            finally:
+                if os.path.exists(part):
+                    os.unlink(part)
+
+        self._added(path.stat().st_size)
+        return path
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        try:
+            if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _entries(self):
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if "." not in entry.name:
+                    try:
+                        yield entry.path, entry.stat()
+                    except FileNotFoundError:
+                        pass
+
+    def _added(self, size: int):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(st.st_size for _, st in self._entries())
+            else:
+                self._size += size
+            if self._size <= self.max_bytes:
+                return
+
+            # Other workers fill the same directory, so recount before evicting.
+            entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+            total = sum(st.st_size for _, st in entries)
+            for file_path, st in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                for victim in (file_path, f"{file_path}.lock"):
+                    try:
+                        os.unlink(victim)
+                    except FileNotFoundError:
+                        pass
+                total -= st.st_size
+            self._size = total
+
+_raw_cache = None
+_raw_cache_lock = threading.Lock()
+
+def raw_cache():
+    """The app's disk cache, or None when UPLOAD_ROOT is not configured."""
+    global _raw_cache
+    if not current_app.config["UPLOAD_ROOT"]:
+        return None
+    if _raw_cache is None:
+        with _raw_cache_lock:
+            if _raw_cache is None:
+                _raw_cache = DiskLRUCache(upload_root(current_app).resolve() / "cache", current_app.config["RAW_CACHE_MAX_BYTES"])
+    return _raw_cache
@@ -0,0 +1,42 @@
+import threading
+import time
+from flask import current_app, render_template
+from markupsafe import Markup
+from .cache import TTLCache
+from .thumbnails import image_sources
+
+_fragments = None
+_fragments_lock = threading.Lock()
+
+def _cache() -> TTLCache:
+    global _fragments
+    if _fragments is None:
+        with _fragments_lock:
+            if _fragments is None:
+                _fragments = TTLCache(
+                    current_app.config["FRAGMENT_CACHE_SIZE"],
+                    current_app.config["S3_PRESIGN_WINDOW"],
+                )
+    return _fragments
+
+def image_fragment(img) -> Markup:
+    """Return the viewer-independent part of a feed item.
+
+    Entries are keyed by image id and reused only while ``images.version`` and
+    the presigned URL window are unchanged, so a stale entry is never served
+    even when another worker made the write.
+    """
+    window = int(time.time() // current_app.config["S3_PRESIGN_WINDOW"])
+    cache = _cache()
+    cached = cache.get(img.id)
+    if cached and cached[0] == (img.version, window):
+        return cached[1]
+
+    img.s3_url, img.srcset = image_sources(img)
+    fragment = Markup(render_template("_image_fragment.html", img=img))
+    cache.set(img.id, ((img.version, window), fragment))
+    return fragment
+
+def forget_fragment(image_id: int):
+    if _fragments is not None:
+        _fragments.pop(image_id)
@@ -1,47 +1,223 @@
+import hashlib
+import mimetypes
+import time
 import uuid
-import boto3
-import os
 from pathlib import Path
-from flask import Blueprint, render_template, request, redirect, session, url_for, flash, send_file, current_app
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash, send_file, current_app, jsonify, make_response
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
-from .models import Image, Like
+from .models import Image, Like, LikeBucket, User
 from . import db
-from .utils import require_login, user_upload_dir, ALLOWED_EXT, handle_hidden_location
-from botocore.client import Config
+from .utils import require_login, user_upload_dir, ALLOWED_EXT, CONTENT_TYPES, handle_hidden_location, keyset_page, pick_ext, ranked_page, unlocked_image_ids, unlock_image
+from .storage import get_s3, object_exists
+from .outbox import delete_objects_later
+from .blobs import claim_direct_upload, release_blob, store_upload
+from .diskcache import raw_cache
+from .trending import record_like_event, trending
+from .passwords import hasher
+from .metrics import observe_s3
+from .routing import read_replica
+from .thumbnails import enqueue_thumbnails
+from .fragments import forget_fragment, image_fragment
+from sqlalchemy import Float, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
 
 image_routes = Blueprint("images", __name__)
 
-def get_s3():
-    return boto3.client(
-            "s3",
-            config=Config(signature_version='s3v4'),
-            region_name=os.environ.get("AWS_REGION")
+RAW_MAX_AGE = 365 * 24 * 3600
+
+def liked_image_ids(user_id: int, image_ids) -> set:
+    if not image_ids:
+        return set()
+    rows = db.session.query(Like.image_id).filter(Like.user_id == user_id, Like.image_id.in_(image_ids))
+    return {image_id for (image_id,) in rows}
+
+def apply_like_change(changed, delta: int) -> bool:
+    """Move likes_count of the image touched by ``changed`` in the same statement.
+
+    ``changed`` is an INSERT or DELETE on likes returning ``image_id``; it runs
+    as a CTE, so a like and its counter update are a single round-trip and a
+    statement that changed no row leaves the counter alone.
+    """
+    changed = changed.returning(Like.image_id, Like.created_at).cte("changed")
+    stmt = (
+        update(Image)
+        .where(Image.id == changed.c.image_id)
+        .values(likes_count=Image.likes_count + delta, version=Image.version + 1)
+        .returning(Image.id, changed.c.created_at)
+        .execution_options(synchronize_session=False)
     )
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return False
+    image_id, liked_at = row
+    forget_fragment(image_id)
+    record_like_event(image_id, delta, liked_at)
+    return True
+
+def bump_images_count(user_id: int, delta: int):
+    User.query.filter_by(id=user_id).update(
+        {User.images_count: User.images_count + delta}, synchronize_session=False
+    )
+
+@image_routes.cli.command("repair-likes-count")
+def repair_likes_count():
+    """Recompute images.likes_count from the likes table."""
+    actual = (
+        db.session.query(func.count(Like.id))
+        .filter(Like.image_id == Image.id)
+        .correlate(Image)
+        .scalar_subquery()
+    )
+    fixed = Image.query.filter(Image.likes_count != actual).update(
+        {Image.likes_count: actual, Image.version: Image.version + 1}, synchronize_session=False
+    )
+    db.session.commit()
+    print(f"Repaired likes_count on {fixed} image(s)")
+
+def render_feed(images, user_id: int, **context) -> str:
+    liked_ids = liked_image_ids(user_id, [img.id for img in images])
+    for img in images:
+        img.is_liked_by_user = img.id in liked_ids
+        img.fragment = image_fragment(img)
+    return render_template("images.html", images=images, current_user_id=user_id, direct_uploads=current_app.config["DIRECT_UPLOADS"], **context)
+
+@image_routes.cli.command("repair-images-count")
+def repair_images_count():
+    """Recompute users.images_count from the images table."""
+    actual = (
+        db.session.query(func.count(Image.id))
+        .filter(Image.user_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    fixed = User.query.filter(User.images_count != actual).update(
+        {User.images_count: actual}, synchronize_session=False
+    )
+    db.session.commit()
+    print(f"Repaired images_count on {fixed} user(s)")
+
+def feed_etag(user_id: int, cursor, images, next_cursor, editing_image_id, unlocked_images) -> str:
+    # Every change that shows in a feed item bumps Image.version; uploads and
+    # deletes change which ids are on the page.
+    presign_window = int(time.time() // current_app.config["S3_PRESIGN_WINDOW"])
+    state = [
+        current_app.config["APP_VERSION"],
+        [(img.id, img.version) for img in images],
+        next_cursor,
+        presign_window,
+        user_id,
+        cursor,
+        editing_image_id,
+        current_app.config["DIRECT_UPLOADS"],
+        sorted(unlocked_images),
+    ]
+    return hashlib.sha256(repr(state).encode()).hexdigest()[:32]
 
 @image_routes.get("/images")
+@read_replica
 def images_list():
     login_redirect = require_login()
     if login_redirect:
         return login_redirect
 
     user_id = int(session["user_id"])
-    images = Image.query.order_by(Image.created_at.desc()).all()
+    cursor = request.args.get("cursor")
     editing_image_id = request.args.get("editing_image_id", type=int)
-    unlocked_images = session.get("unlocked_images", [])
-    s3 = get_s3()
-    
-    for img in images:
-        img.likes_count = Like.query.filter_by(image_id=img.id).count()
-        img.is_liked_by_user = Like.query.filter_by(image_id=img.id, user_id=user_id).first() is not None
+    unlocked_images = unlocked_image_ids()
+
+    # A page showing a flash message differs from the same feed without it, so it must not be cached.
+    flashing = bool(session.get("_flashes"))
+    images, next_cursor = keyset_page(Image.query, Image, cursor, current_app.config["IMAGES_PAGE_SIZE"])
+    etag = feed_etag(user_id, cursor, images, next_cursor, editing_image_id, unlocked_images)
+    if etag in request.if_none_match and not flashing:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    response = make_response(render_feed(images, user_id, editing_image_id=editing_image_id, unlocked_images=unlocked_images, cursor=cursor, next_cursor=next_cursor))
+    if flashing:
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
-        img.s3_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': current_app.config['S3_BUCKET_NAME'], 'Key': img.stored_filename},
-            ExpiresIn=3600
-        )
+@image_routes.get("/images/trending")
+@read_replica
+def images_trending():
+    login_redirect = require_login()
+    if login_redirect:
+        return login_redirect
 
-    return render_template("images.html", images=images, current_user_id=user_id, editing_image_id=editing_image_id, unlocked_images=unlocked_images)
+    image_ids = trending.top()
+    by_id = {img.id: img for img in Image.query.filter(Image.id.in_(image_ids))} if image_ids else {}
+    images = [by_id[image_id] for image_id in image_ids if image_id in by_id]
+    return render_feed(images, int(session["user_id"]), unlocked_images=unlocked_image_ids(), trending=True)
+
+@image_routes.get("/images/search")
+@read_replica
+def images_search():
+    login_redirect = require_login()
+    if login_redirect:
+        return login_redirect
+
+    search_query = request.args.get("q", "").strip()
+    if not search_query:
+        return redirect(url_for("images.images_list"))
+
+    user_id = int(session["user_id"])
+    cursor = request.args.get("cursor")
+    ts_query = func.websearch_to_tsquery("simple", search_query)
+    matches = Image.query.filter(Image.search_vector.bool_op("@@")(ts_query))
+    rank = func.ts_rank(Image.search_vector, ts_query).cast(Float)
+    images, next_cursor = ranked_page(matches, Image, rank, cursor, current_app.config["IMAGES_PAGE_SIZE"])
+    return render_feed(images, user_id, unlocked_images=unlocked_image_ids(), cursor=cursor, next_cursor=next_cursor, search_query=search_query)
+
+@image_routes.get("/users/<int:user_id>/images")
+@read_replica
+def user_images(user_id: int):
+    login_redirect = require_login()
+    if login_redirect:
+        return login_redirect
+
+    owner = db.session.get(User, user_id)
+    if owner is None:
+        flash("User not found")
+        return redirect(url_for("images.images_list"))
+
+    cursor = request.args.get("cursor")
+    images, next_cursor = keyset_page(Image.query.filter_by(user_id=owner.id), Image, cursor, current_app.config["IMAGES_PAGE_SIZE"])
+    return render_feed(images, int(session["user_id"]), unlocked_images=unlocked_image_ids(), cursor=cursor, next_cursor=next_cursor, gallery_user=owner)
+
+@image_routes.get("/images/<int:image_id>/raw")
+@read_replica
+def image_raw(image_id: int):
+    login_redirect = require_login()
+    if login_redirect:
+        return login_redirect
+
+    cache = raw_cache()
+    img = db.session.get(Image, image_id) if cache else None
+    if img is None:
+        return "Image not found", 404
+
+    key = (img.thumbnail_keys or {}).get(request.args.get("w"), img.stored_filename)
+    path = cache.get(key)
+    if path is None:
+        return "Image not found", 404
+
+    response = send_file(
+        path,
+        mimetype=mimetypes.guess_type(key)[0] or "application/octet-stream",
+        conditional=True,
+        etag=hashlib.sha256(key.encode()).hexdigest()[:32],
+        max_age=RAW_MAX_AGE,
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
 
 @image_routes.post("/images/upload")
 def images_upload():
@@ -64,25 +240,102 @@ def images_upload():
         flash("Unsupported file type")
         return redirect(url_for("images.images_list"))
 
-    stored_filename = f"{uuid.uuid4().hex}{ext}"
-    s3 = get_s3()
-    s3.upload_fileobj(
-        f,
-        current_app.config["S3_BUCKET_NAME"],
-        stored_filename,
-        ExtraArgs={"ContentType": f.content_type}
+    img = Image(
+        user_id=user_id,
+        description=description,
     )
+    if not handle_hidden_location(request.form, img):
+        flash("Password is required when hiding location.")
+        return redirect(url_for("images.images_list"))
+
+    img.stored_filename = store_upload(f, ext)
+    db.session.add(img)
+    db.session.flush()
+    enqueue_thumbnails(img)
+    bump_images_count(user_id, 1)
+    db.session.commit()
+
+    flash("Uploaded")
+    return redirect(url_for("images.images_list"))
+
+def upload_signer():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="direct-upload")
+
+@image_routes.post("/images/upload-url")
+def images_upload_url():
+    if not session.get("user_id"):
+        return jsonify(error="Login required"), 401
+
+    user_id = int(session["user_id"])
+    try:
+        ext = pick_ext(request.form.get("filename"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # The policy pins the type implied by the extension, never one the client picked.
+    content_type = CONTENT_TYPES[ext]
+    stored_filename = f"{uuid.uuid4().hex}{ext}"
+    expires_in = current_app.config["DIRECT_UPLOAD_EXPIRES"]
+    with observe_s3("PresignPost"):
+        post = get_s3().generate_presigned_post(
+            Bucket=current_app.config["S3_BUCKET_NAME"],
+            Key=stored_filename,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, current_app.config["MAX_UPLOAD_BYTES"]],
+            ],
+            ExpiresIn=expires_in,
+        )
+    token = upload_signer().dumps({"key": stored_filename, "user_id": user_id})
+    return jsonify(url=post["url"], fields=post["fields"], token=token)
+
+@image_routes.post("/images/upload/confirm")
+def images_upload_confirm():
+    login_redirect = require_login()
+    if login_redirect:
+        return login_redirect
+
+    user_id = int(session["user_id"])
+    try:
+        payload = upload_signer().loads(
+            request.form.get("upload_token", ""),
+            max_age=current_app.config["DIRECT_UPLOAD_EXPIRES"] * 2,
+        )
+    except BadSignature:
+        flash("Upload expired, please try again")
+        return redirect(url_for("images.images_list"))
+
+    stored_filename = payload["key"]
+    if payload["user_id"] != user_id:
+        flash("Access denied")
+        return redirect(url_for("images.images_list"))
+
+    if not claim_direct_upload(stored_filename):
+        db.session.rollback()
+        return redirect(url_for("images.images_list"))
+
+    if not object_exists(stored_filename):
+        db.session.rollback()
+        flash("Upload not found")
+        return redirect(url_for("images.images_list"))
 
     img = Image(
         user_id=user_id,
         stored_filename=stored_filename,
-        description=description,
+        description=request.form.get("description"),
     )
     if not handle_hidden_location(request.form, img):
+        if release_blob(stored_filename):
+            delete_objects_later([stored_filename])
+        db.session.commit()
         flash("Password is required when hiding location.")
         return redirect(url_for("images.images_list"))
 
     db.session.add(img)
+    db.session.flush()
+    enqueue_thumbnails(img)
+    bump_images_count(user_id, 1)
     db.session.commit()
 
     flash("Uploaded")
@@ -106,11 +359,13 @@ def images_edit(image_id: int):
             flash("Password is required when hiding location.")
             return redirect(url_for("images.images_list"))
 
+        img.version = Image.version + 1
+        forget_fragment(img.id)
         db.session.commit()
         flash("Image updated")
         return redirect(url_for("images.images_list"))
 
-    return redirect(url_for("images.images_list", editing_image_id=image_id))
+    return redirect(url_for("images.images_list", editing_image_id=image_id, cursor=request.args.get("cursor")))
 
 @image_routes.post("/images/<int:image_id>/delete")
 def images_delete(image_id: int):
@@ -125,13 +380,13 @@ def images_delete(image_id: int):
         flash("Access denied")
         return redirect(url_for("images.images_list"))
 
-    s3 = get_s3()
-    s3.delete_object(
-        Bucket=current_app.config["S3_BUCKET_NAME"],
-        Key=img.stored_filename
-    )
-
+    if release_blob(img.stored_filename):
+        delete_objects_later([img.stored_filename, *(img.thumbnail_keys or {}).values()])
+    Like.query.filter_by(image_id=img.id).delete(synchronize_session=False)
+    LikeBucket.query.filter_by(image_id=img.id).delete(synchronize_session=False)
     db.session.delete(img)
+    bump_images_count(user_id, -1)
+    forget_fragment(img.id)
     db.session.commit()
 
     flash("Deleted")
@@ -144,18 +399,19 @@ def like_image(image_id: int):
         return login_redirect
 
     user_id = int(session["user_id"])
-    img = Image.query.get(image_id)
-    if not img:
-        flash("Image not found")
-        return redirect(url_for("images.images_list"))
-
-    existing_like = Like.query.filter_by(user_id=user_id, image_id=image_id).first()
-    if existing_like:
-        flash("You already liked this image.")
+    inserted = (
+        insert(Like)
+        .from_select(["user_id", "image_id"], select(literal(user_id), Image.id).where(Image.id == image_id))
+        .on_conflict_do_nothing(index_elements=[Like.user_id, Like.image_id])
+    )
+    if not apply_like_change(inserted, 1):
+        db.session.rollback()
+        if db.session.get(Image, image_id) is None:
+            flash("Image not found")
+        else:
+            flash("You already liked this image.")
         return redirect(url_for("images.images_list"))
 
-    like = Like(user_id=user_id, image_id=image_id)
-    db.session.add(like)
     db.session.commit()
 
     flash("Image liked.")
@@ -168,12 +424,12 @@ def unlike_image(image_id: int):
         return login_redirect
 
     user_id = int(session["user_id"])
-    like = Like.query.filter_by(user_id=user_id, image_id=image_id).first()
-    if not like:
+    deleted = delete(Like).where(Like.user_id == user_id, Like.image_id == image_id)
+    if not apply_like_change(deleted, -1):
+        db.session.rollback()
         flash("You haven't liked this image.")
         return redirect(url_for("images.images_list"))
 
-    db.session.delete(like)
     db.session.commit()
 
     flash("Like removed.")
@@ -191,11 +447,8 @@ def unlock_location(image_id: int):
         return redirect(url_for("images.images_list"))
 
     password = request.form.get("password", "")
-    if img.location_password_hash and check_password_hash(img.location_password_hash, password):
-        unlocked = session.get("unlocked_images", [])
-        if image_id not in unlocked:
-            unlocked.append(image_id)
-        session["unlocked_images"] = unlocked
+    if img.location_password_hash and hasher.verify(img.location_password_hash, password):
+        unlock_image(image_id)
     else:
         flash("Wrong password")
 
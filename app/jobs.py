@@ -0,0 +1,93 @@
+import time
+from datetime import datetime, timedelta, timezone
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+from . import db
+from .models import Job
+
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+_handlers = {}
+
+def job_handler(kind: str, batch_size: int = 1):
+    def register(func_):
+        _handlers[kind] = (func_, batch_size)
+        return func_
+    return register
+
+def enqueue(kind: str, **payload):
+    job = Job(kind=kind, payload=payload)
+    db.session.add(job)
+    return job
+
+def claim_batch():
+    head = (
+        Job.query.filter(Job.failed.is_(False), Job.run_after <= func.now())
+        .order_by(Job.id.asc())
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if head is None:
+        return None, []
+
+    _, batch_size = _handlers.get(head.kind, (None, 1))
+    batch = [head]
+    if batch_size > 1:
+        batch += (
+            Job.query.filter(
+                Job.kind == head.kind,
+                Job.id != head.id,
+                Job.failed.is_(False),
+                Job.run_after <= func.now(),
+            )
+            .order_by(Job.id.asc())
+            .limit(batch_size - 1)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+    return head.kind, batch
+
+def run_once() -> int:
+    kind, batch = claim_batch()
+    if not batch:
+        db.session.rollback()
+        return 0
+
+    job_ids = [job.id for job in batch]
+    handler, _ = _handlers.get(kind, (None, 1))
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind {kind!r}")
+        handler([job.payload for job in batch])
+        for job in batch:
+            db.session.delete(job)
+        db.session.commit()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        db.session.rollback()
+        current_app.logger.exception("Job batch %s failed", job_ids)
+        retry_later(job_ids, repr(e))
+    return len(batch)
+
+def retry_later(job_ids, error: str):
+    max_attempts = current_app.config["JOB_MAX_ATTEMPTS"]
+    now = datetime.now(timezone.utc)
+    for job in Job.query.filter(Job.id.in_(job_ids)):
+        job.attempts += 1
+        job.last_error = error
+        job.failed = job.attempts >= max_attempts
+        job.run_after = now + timedelta(seconds=min(2 ** job.attempts, 3600))
+    db.session.commit()
+
+@jobs_cli.command("work")
+@click.option("--once", is_flag=True, help="Drain the queue and exit instead of polling.")
+def work(once):
+    """Run a job worker."""
+    idle = current_app.config["JOB_POLL_INTERVAL"]
+    while True:
+        if run_once():
+            continue
+        if once:
+            break
+        time.sleep(idle)
@@ -0,0 +1,109 @@
+import os
+import time
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_SECONDS = Histogram(
+    "pictapp_http_request_duration_seconds", "Request latency", ["endpoint", "method", "status"]
+)
+REQUEST_QUERIES = Histogram(
+    "pictapp_http_request_sql_queries", "SQL queries per request", ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_SQL_SECONDS = Histogram("pictapp_http_request_sql_seconds", "SQL time per request", ["endpoint"])
+S3_SECONDS = Histogram("pictapp_s3_call_duration_seconds", "S3 call latency", ["operation"])
+S3_ERRORS = Counter("pictapp_s3_call_errors_total", "Failed S3 calls", ["operation"])
+PASSWORD_HASH_SECONDS = Histogram("pictapp_password_hash_seconds", "Time spent hashing or verifying a password")
+PASSWORD_HASH_QUEUE_SECONDS = Histogram("pictapp_password_hash_queue_seconds", "Wait for a password hashing process")
+PASSWORD_HASH_REJECTED = Counter("pictapp_password_hash_rejected_total", "Hashes refused because the pool was full")
+UPLOAD_DEDUP_HITS = Counter("pictapp_upload_dedup_hits_total", "Uploads whose content was already stored")
+RATE_LIMITED = Counter("pictapp_rate_limited_total", "Requests rejected by the rate limiter", ["endpoint"])
+STARTUP_SECONDS = Gauge("pictapp_startup_seconds", "Time from wsgi.py import to a ready app", multiprocess_mode="max")
+
+@contextmanager
+def observe_s3(operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        S3_ERRORS.labels(operation).inc()
+        raise
+    finally:
+        S3_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+def instrument_s3_client(client):
+    def before_call(model, context, **_kwargs):
+        context["pictapp_started"] = time.perf_counter()
+
+    def after_call(model, context, **kwargs):
+        started = context.pop("pictapp_started", None)
+        if started is None:
+            return
+        S3_SECONDS.labels(model.name).observe(time.perf_counter() - started)
+        http_response = kwargs.get("http_response")
+        if "exception" in kwargs or (http_response is not None and http_response.status_code >= 400):
+            S3_ERRORS.labels(model.name).inc()
+
+    client.meta.events.register("before-call.s3", before_call)
+    client.meta.events.register("after-call.s3", after_call)
+    client.meta.events.register("after-call-error.s3", after_call)
+
+def _before_cursor_execute(_conn, _cursor, _statement, _params, context, _executemany):
+    context.pictapp_started = time.perf_counter()
+
+def _after_cursor_execute(_conn, _cursor, statement, _params, context, _executemany):
+    started = getattr(context, "pictapp_started", None)
+    if started is None or not has_request_context():
+        return
+    stats = g.setdefault("sql_stats", {"count": 0, "seconds": 0.0, "statements": []})
+    elapsed = time.perf_counter() - started
+    stats["count"] += 1
+    stats["seconds"] += elapsed
+    if g.get("log_sql"):
+        stats["statements"].append((elapsed, statement))
+
+def init_metrics(app):
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.log_sql = app.config["SLOW_REQUEST_SECONDS"] > 0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        stats = g.get("sql_stats", {"count": 0, "seconds": 0.0, "statements": []})
+
+        REQUEST_SECONDS.labels(endpoint, request.method, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(endpoint).observe(stats["count"])
+        REQUEST_SQL_SECONDS.labels(endpoint).observe(stats["seconds"])
+
+        if 0 < app.config["SLOW_REQUEST_SECONDS"] <= elapsed:
+            app.logger.warning(
+                "Slow request %s %s: %.3fs, %d queries in %.3fs\n%s",
+                request.method,
+                request.full_path,
+                elapsed,
+                stats["count"],
+                stats["seconds"],
+                "\n".join(f"  {seconds * 1000:.1f}ms {statement}" for seconds, statement in stats["statements"]),
+            )
+        return response
+
+    @app.get("/metrics")
+    def metrics():
+        registry = REGISTRY
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
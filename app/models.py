@@ -1,4 +1,6 @@
 from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import INET, TSVECTOR, insert
+from sqlalchemy.orm import deferred
 from . import db
 
 class User(db.Model):
@@ -7,25 +9,108 @@ class User(db.Model):
     username = db.Column(db.Text, unique=True, nullable=False)
     password_hash = db.Column(db.Text, nullable=False)
     last_ip = db.Column(db.Text)
+    last_inet = db.Column(INET, nullable=True)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=text("false"))
+    images_count = db.Column(db.Integer, nullable=False, default=0, server_default=text("0"))
+
+    __table_args__ = (
+        db.Index("ix_users_last_ip_pattern", last_ip, postgresql_ops={"last_ip": "text_pattern_ops"}),
+        db.Index("ix_users_last_inet", last_inet, postgresql_using="gist", postgresql_ops={"last_inet": "inet_ops"}),
+    )
 
 class Image(db.Model):
     __tablename__ = "images"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, nullable=False, index=True)
-    stored_filename = db.Column(db.Text, nullable=False, unique=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    stored_filename = db.Column(db.Text, nullable=False, index=True)
     created_at = db.Column(db.DateTime(timezone=True), server_default=text("now()"), nullable=False)
     description = db.Column(db.String, nullable=True)
     location = db.Column(db.String, nullable=True)
     location_is_hidden = db.Column(db.Boolean, default=False)
     location_password_hash = db.Column(db.String(255), nullable=True)
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default=text("0"))
+    thumbnail_keys = db.Column(db.JSON(none_as_null=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default=text("1"))
+    search_vector = deferred(db.Column(
+        TSVECTOR,
+        db.Computed(
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'A') || "
+            "setweight(to_tsvector('simple', CASE WHEN location_is_hidden THEN '' ELSE coalesce(location, '') END), 'B')",
+            persisted=True,
+        ),
+    ))
+
+    __table_args__ = (
+        db.Index("ix_images_created_at_id", created_at.desc(), id.desc()),
+        db.Index("ix_images_user_id_created_at_id", user_id, created_at.desc(), id.desc()),
+        db.Index("ix_images_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+class Blob(db.Model):
+    __tablename__ = "blobs"
+    key = db.Column(db.Text, primary_key=True)
+    sha256 = db.Column(db.Text, nullable=True, unique=True)
+    refcount = db.Column(db.Integer, nullable=False, default=1)
 
 class Like(db.Model):
     __tablename__ = "likes"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
     image_id = db.Column(db.Integer, nullable=False, index=True)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=text("now()"), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint(user_id, image_id, name="uq_likes_user_id_image_id"),
+    )
+
+class LikeBucket(db.Model):
+    __tablename__ = "like_buckets"
+    image_id = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.DateTime(timezone=True), primary_key=True, index=True)
+    likes = db.Column(db.Integer, nullable=False, default=0)
 
 class Banned(db.Model):
     __tablename__ = "banned"
     id = db.Column(db.Integer, primary_key=True)
-    ip = db.Column(db.Text, unique=True)
\ No newline at end of file
+    ip = db.Column(db.Text, unique=True)
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Boolean, nullable=False, default=False)
+    last_error = db.Column(db.Text, nullable=True)
+    run_after = db.Column(db.DateTime(timezone=True), server_default=text("now()"), nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_jobs_failed_run_after", failed, run_after),
+    )
+
+class ServerSessionRow(db.Model):
+    __tablename__ = "sessions"
+    sid = db.Column(db.Text, primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    __tablename__ = "rate_limits"
+    key = db.Column(db.Text, primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+class Counter(db.Model):
+    __tablename__ = "counters"
+    name = db.Column(db.Text, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+def bump_counter(name: str):
+    stmt = insert(Counter).values(name=name, value=1).on_conflict_do_update(
+        index_elements=[Counter.name], set_={"value": Counter.value + 1}
+    )
+    db.session.execute(stmt)
+
+def read_counter(name: str) -> int:
+    return db.session.query(Counter.value).filter_by(name=name).scalar() or 0
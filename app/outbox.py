@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import PurePosixPath
+import click
+from flask import current_app
+from .jobs import enqueue, job_handler, jobs_cli
+from .models import Image
+from .storage import get_s3, forget_presigned_url
+from .utils import ALLOWED_EXT
+from . import db
+
+S3_DELETE_JOB = "s3_delete"
+S3_DELETE_BATCH = 1000
+
+def delete_objects_later(keys):
+    for key in keys:
+        enqueue(S3_DELETE_JOB, key=key)
+        forget_presigned_url(key)
+
+@job_handler(S3_DELETE_JOB, batch_size=S3_DELETE_BATCH)
+def delete_objects(payloads):
+    keys = sorted({payload["key"] for payload in payloads})
+    response = get_s3().delete_objects(
+        Bucket=current_app.config["S3_BUCKET_NAME"],
+        Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+    )
+    errors = response.get("Errors", [])
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(keys)} S3 deletes failed, first: {errors[0]}")
+
+def original_candidates(key: str):
+    path = PurePosixPath(key)
+    if path.parts[0] == "thumbs":
+        stem = path.stem.rsplit("_", 1)[0]
+        return [f"{stem}{ext}" for ext in ALLOWED_EXT]
+    return [key]
+
+@jobs_cli.command("sweep-orphans")
+@click.option("--min-age-hours", default=24, show_default=True, help="Ignore objects younger than this.")
+@click.option("--dry-run", is_flag=True, help="Only report orphaned keys.")
+def sweep_orphans(min_age_hours, dry_run):
+    """Queue deletes for bucket objects no image row refers to."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=min_age_hours)
+    paginator = get_s3().get_paginator("list_objects_v2")
+    orphans = 0
+    for page in paginator.paginate(Bucket=current_app.config["S3_BUCKET_NAME"]):
+        objects = [obj["Key"] for obj in page.get("Contents", []) if obj["LastModified"] < cutoff]
+        candidates = {key: original_candidates(key) for key in objects}
+        wanted = {name for names in candidates.values() for name in names}
+        known = {
+            name
+            for (name,) in Image.query.with_entities(Image.stored_filename).filter(Image.stored_filename.in_(wanted))
+        } if wanted else set()
+
+        page_orphans = [key for key, names in candidates.items() if known.isdisjoint(names)]
+        for key in page_orphans:
+            print(key)
+        if not dry_run:
+            delete_objects_later(page_orphans)
+            db.session.commit()
+        orphans += len(page_orphans)
+
+    print(f"{'Found' if dry_run else 'Queued deletes for'} {orphans} orphaned object(s)")
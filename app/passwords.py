@@ -0,0 +1,85 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+from .metrics import PASSWORD_HASH_QUEUE_SECONDS, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+
+class PasswordHashingOverloaded(Exception):
+    pass
+
+def hash_method_prefix(method: str) -> str:
+    """The method part werkzeug writes before the first ``$`` for ``method``,
+    with its defaults filled in, e.g. ``scrypt`` -> ``scrypt:32768:8:1``."""
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        args = ["32768", "8", "1"]
+    elif name == "pbkdf2":
+        args = (args or ["sha256"])[:1] + [args[1] if len(args) > 1 else str(DEFAULT_PBKDF2_ITERATIONS)]
+    return ":".join([name, *args])
+
+def _timed(func, submitted_at: float, *args):
+    started_at = time.time()
+    result = func(*args)
+    return result, started_at - submitted_at, time.time() - started_at
+
+class PasswordHasher:
+    """Runs password hashing in a bounded process pool.
+
+    At most PASSWORD_HASH_QUEUE hashes may be in flight per web worker; callers
+    beyond that wait PASSWORD_HASH_QUEUE_TIMEOUT seconds and then get
+    PasswordHashingOverloaded, which the app turns into a 503.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._slots = None
+
+    def _setup(self):
+        with self._lock:
+            if self._slots is not None:
+                return
+            workers = current_app.config["PASSWORD_HASH_WORKERS"]
+            if workers > 0:
+                # Forking a threaded web worker can copy locks held by other threads
+                # and would run the app's at-fork hook; a forkserver avoids both.
+                self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+            self._slots = threading.BoundedSemaphore(current_app.config["PASSWORD_HASH_QUEUE"])
+
+    def reset(self):
+        """Forget the pool in a forked child; it belongs to the parent process."""
+        self._lock = threading.Lock()
+        self._pool = None
+        self._slots = None
+
+    def _run(self, func, *args):
+        if self._slots is None:
+            self._setup()
+        if not self._slots.acquire(timeout=current_app.config["PASSWORD_HASH_QUEUE_TIMEOUT"]):
+            PASSWORD_HASH_REJECTED.inc()
+            raise PasswordHashingOverloaded()
+        try:
+            submitted_at = time.time()
+            if self._pool is None:
+                result, queue_wait, hash_time = _timed(func, submitted_at, *args)
+            else:
+                result, queue_wait, hash_time = self._pool.submit(_timed, func, submitted_at, *args).result()
+        finally:
+            self._slots.release()
+        PASSWORD_HASH_QUEUE_SECONDS.observe(max(queue_wait, 0.0))
+        PASSWORD_HASH_SECONDS.observe(hash_time)
+        return result
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, current_app.config["PASSWORD_HASH_METHOD"])
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        expected = hash_method_prefix(current_app.config["PASSWORD_HASH_METHOD"])
+        return password_hash.split("$", 1)[0] != expected
+
+hasher = PasswordHasher()
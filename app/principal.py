@@ -0,0 +1,38 @@
+from collections import namedtuple
+from flask import current_app, g, session
+from .cache import TTLCache
+from .models import User
+
+Principal = namedtuple("Principal", ["id", "username", "is_admin"])
+
+_principals = None
+
+def _cache():
+    global _principals
+    if _principals is None:
+        _principals = TTLCache(
+            current_app.config["PRINCIPAL_CACHE_SIZE"],
+            current_app.config["PRINCIPAL_CACHE_TTL"],
+        )
+    return _principals
+
+def current_user():
+    if "principal" in g:
+        return g.principal
+
+    principal = None
+    user_id = session.get("user_id")
+    if user_id:
+        principal = _cache().get(user_id)
+        if principal is None:
+            row = User.query.with_entities(User.id, User.username, User.is_admin).filter_by(id=user_id).first()
+            if row:
+                principal = Principal(row.id, row.username, bool(row.is_admin))
+                _cache().set(user_id, principal)
+
+    g.principal = principal
+    return principal
+
+def forget_principal(user_id: int):
+    _cache().pop(user_id)
+    g.pop("principal", None)
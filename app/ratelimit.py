@@ -0,0 +1,124 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask import request, session
+from sqlalchemy import extract, func
+from sqlalchemy.dialects.postgresql import insert
+from . import db
+from .jobs import jobs_cli
+from .metrics import RATE_LIMITED
+from .models import RateLimitBucket
+
+SLOT = struct.Struct("<Qdd")
+
+class SharedMemoryBuckets:
+    """Token buckets in a fixed-size table in a shared mmap'd file.
+
+    Every worker process on the host maps the same file; a slot is guarded by
+    a POSIX record lock on its byte range (and a thread lock within the
+    process). Keys hash onto slots, so a colliding key simply resets the
+    bucket it lands on; that only ever lets a request through.
+    """
+
+    def __init__(self, path: str, slots: int):
+        self.slots = slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = slots * SLOT.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take a token; return 0 on success or the seconds until one is available."""
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        offset = key_hash % self.slots * SLOT.size
+        now = time.time()
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, SLOT.size, offset)
+            try:
+                stored_hash, tokens, updated_at = SLOT.unpack_from(self._map, offset)
+                if stored_hash != key_hash:
+                    tokens, updated_at = capacity, now
+                tokens = min(capacity, tokens + max(now - updated_at, 0) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT.size, offset)
+        return wait
+
+class SqlBuckets:
+    """Token buckets in the ``rate_limits`` table, for limits shared across hosts.
+
+    Refill and take happen in one upsert. A rejected request still costs a
+    token down to -1, so a client that keeps hammering stays throttled.
+    """
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        refilled = func.least(
+            capacity,
+            RateLimitBucket.tokens + extract("epoch", func.now() - RateLimitBucket.updated_at) * rate,
+        )
+        stmt = insert(RateLimitBucket).values(key=key, tokens=capacity - 1, updated_at=func.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tokens": func.greatest(refilled - 1, -1), "updated_at": func.now()},
+        ).returning(RateLimitBucket.tokens)
+        with db.engine.begin() as conn:
+            tokens = conn.execute(stmt).scalar()
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+def init_rate_limits(app):
+    backend = app.config["RATE_LIMIT_BACKEND"]
+    limits = app.config["RATE_LIMITS"]
+    if backend == "off" or not limits:
+        return
+
+    state = {}
+    state_lock = threading.Lock()
+
+    def buckets():
+        # Opened per process on first use, so nothing is shared by accident across fork.
+        if state.get("pid") != os.getpid():
+            with state_lock:
+                if state.get("pid") != os.getpid():
+                    if backend == "sql":
+                        state["buckets"] = SqlBuckets()
+                    else:
+                        state["buckets"] = SharedMemoryBuckets(app.config["RATE_LIMIT_SHM_PATH"], app.config["RATE_LIMIT_SLOTS"])
+                    state["pid"] = os.getpid()
+        return state["buckets"]
+
+    @app.before_request
+    def rate_limit():
+        limit = limits.get(request.endpoint)
+        if limit is None or request.method != "POST":
+            return None
+
+        # remote_addr is the address our own proxy saw (see TRUSTED_PROXY_HOPS),
+        # not the spoofable left end of X-Forwarded-For.
+        keys = [f"ip:{request.remote_addr}:{request.endpoint}"]
+        if session.get("user_id"):
+            keys.append(f"user:{session['user_id']}:{request.endpoint}")
+        wait = max(buckets().take(key, *limit) for key in keys)
+        if not wait:
+            return None
+
+        RATE_LIMITED.labels(request.endpoint).inc()
+        return "Too many requests, please try again later", 429, {"Retry-After": str(math.ceil(wait))}
+
+@jobs_cli.command("purge-rate-limits")
+def purge_rate_limits():
+    """Delete rate limit buckets that have been idle for a day."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=1)
+    deleted = RateLimitBucket.query.filter(RateLimitBucket.updated_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    print(f"Deleted {deleted} idle rate limit bucket(s)")
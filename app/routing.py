@@ -0,0 +1,65 @@
+import functools
+import random
+import time
+from flask import g, has_app_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+
+REPLICA_PREFIX = "replica_"
+
+class RoutingSession(Session):
+    """Sends SELECTs issued inside a ``read_replica`` view to a replica; writes,
+    flushes and everything else keep going to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and clause is not None
+            and getattr(clause, "is_select", False)
+            and has_app_context()
+            and g.get("db_replica")
+        ):
+            return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_write(_session):
+    if has_app_context():
+        g.db_wrote = True
+
+def engine_options(config) -> dict:
+    if config["DB_PGBOUNCER"]:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    }
+
+def replica_binds(urls, options: dict) -> dict:
+    return {f"{REPLICA_PREFIX}{i}": {"url": url, **options} for i, url in enumerate(urls)}
+
+def read_replica(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = g.get("db_replicas")
+        if replicas and session.get("primary_until", 0) <= time.time():
+            g.db_replica = random.choice(replicas)
+        return view(*args, **kwargs)
+    return wrapper
+
+def init_routing(app):
+    replicas = [key for key in app.config.get("SQLALCHEMY_BINDS", {}) if key.startswith(REPLICA_PREFIX)]
+
+    @app.before_request
+    def expose_replicas():
+        g.db_replicas = replicas
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get("db_wrote") and session.get("user_id") and replicas:
+            session["primary_until"] = int(time.time() + app.config["REPLICA_STICKY_SECONDS"])
+        return response
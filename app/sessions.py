@@ -0,0 +1,132 @@
+import secrets
+from datetime import datetime, timezone
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from werkzeug.datastructures import CallbackDict
+from . import db
+from .cache import TTLCache
+from .jobs import jobs_cli
+from .models import ServerSessionRow
+
+serializer = TaggedJSONSerializer()
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, version=0, new=False):
+        def on_update(self_):
+            self_.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.version = version
+        self.new = new
+        self.modified = False
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh session id; the old one is deleted on save."""
+        if not self.new:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.version = 0
+        self.new = True
+        self.modified = True
+
+class SqlSessionInterface(SessionInterface):
+    """Keeps session data in the ``sessions`` table; the cookie only carries
+    ``<session id>.<version>``.
+
+    Each write bumps the version and re-issues the cookie, so a worker's
+    in-memory copy is used only when it matches the version the browser sent
+    and the row still has. That check reads the primary key alone, and a
+    logout or session rotation in any worker takes effect on the next request.
+    """
+
+    def __init__(self, cache_size: int, cache_ttl: float):
+        self.cache = TTLCache(cache_size, cache_ttl)
+
+    def open_session(self, app, request):
+        sid, version = self._parse_cookie(request.cookies.get(self.get_cookie_name(app)))
+        if sid is None:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+        cached = self.cache.get(sid)
+        if cached and cached[0] == version:
+            current = (
+                db.session.query(ServerSessionRow.version)
+                .filter(ServerSessionRow.sid == sid, ServerSessionRow.expires_at > func.now())
+                .scalar()
+            )
+            if current == version:
+                return ServerSession(serializer.loads(cached[1]), sid=sid, version=version)
+            self.cache.pop(sid)
+
+        row = ServerSessionRow.query.filter(ServerSessionRow.sid == sid, ServerSessionRow.expires_at > func.now()).first()
+        if row is None:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+        self.cache.set(sid, (row.version, row.data))
+        return ServerSession(serializer.loads(row.data), sid=sid, version=row.version)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.replaced_sid:
+            self._delete(session.replaced_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self._delete(session.sid)
+            if session.modified and (not session.new or session.replaced_sid):
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified:
+            return
+
+        data = serializer.dumps(dict(session))
+        version = session.version + 1
+        expires_at = datetime.now(timezone.utc) + app.permanent_session_lifetime
+        stmt = insert(ServerSessionRow).values(sid=session.sid, data=data, version=version, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ServerSessionRow.sid],
+            set_={"data": data, "version": version, "expires_at": expires_at},
+        )
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+        self.cache.set(session.sid, (version, data))
+
+        response.set_cookie(
+            name,
+            f"{session.sid}.{version}",
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _delete(self, sid: str):
+        self.cache.pop(sid)
+        with db.engine.begin() as conn:
+            conn.execute(ServerSessionRow.__table__.delete().where(ServerSessionRow.sid == sid))
+
+    @staticmethod
+    def _parse_cookie(value):
+        if not value or "." not in value:
+            return None, 0
+        sid, _, version = value.rpartition(".")
+        if not sid or not version.isdigit():
+            return None, 0
+        return sid, int(version)
+
+@jobs_cli.command("purge-sessions")
+def purge_sessions():
+    """Delete expired server-side sessions."""
+    deleted = ServerSessionRow.query.filter(ServerSessionRow.expires_at <= func.now()).delete(synchronize_session=False)
+    db.session.commit()
+    print(f"Deleted {deleted} expired session(s)")
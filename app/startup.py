@@ -0,0 +1,63 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+import click
+from flask import current_app
+from .metrics import STARTUP_SECONDS
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)$")
+
+def reset_after_fork(app):
+    """Drop clients and pooled connections a worker inherited from a preloading master."""
+    from . import db  # pylint: disable=import-outside-toplevel
+    from .passwords import hasher  # pylint: disable=import-outside-toplevel
+    from .storage import reset_s3  # pylint: disable=import-outside-toplevel
+
+    reset_s3()
+    hasher.reset()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def init_startup(app):
+    os.register_at_fork(after_in_child=lambda: reset_after_fork(app))
+
+    @app.cli.command("startup-report")
+    @click.option("--top", default=15, help="Number of slowest imports to list.")
+    def startup_report(top):
+        """Boot wsgi.py in a fresh interpreter and report where the time goes."""
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import wsgi"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=False,
+        )
+        total = time.perf_counter() - started
+        if result.returncode:
+            raise click.ClickException(f"wsgi.py failed to start:\n{result.stderr[-2000:]}")
+
+        packages = {}
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match:
+                package = match.group(2).split(".")[0]
+                packages[package] = packages.get(package, 0) + int(match.group(1)) / 1000
+        imports = sorted(((ms, package) for package, ms in packages.items()), reverse=True)
+
+        budget = current_app.config["STARTUP_BUDGET_SECONDS"]
+        print(f"Cold start: {total * 1000:.0f}ms (budget {budget * 1000:.0f}ms)")
+        print("Import time by package:")
+        for ms, package in imports[:top]:
+            print(f"  {ms:8.1f}ms  {package}")
+        if total > budget:
+            raise click.ClickException("Cold start is over budget")
+
+def report_startup(app, started: float):
+    elapsed = time.perf_counter() - started
+    STARTUP_SECONDS.set(elapsed)
+    budget = app.config["STARTUP_BUDGET_SECONDS"]
+    log = app.logger.warning if elapsed > budget else app.logger.info
+    log("PictApp started in %.0fms (budget %.0fms)", elapsed * 1000, budget * 1000)
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from .metrics import instrument_s3_client, observe_s3
+
+_s3_client = None
+_s3_lock = threading.Lock()
+
+def get_s3():
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                import boto3  # pylint: disable=import-outside-toplevel
+                from botocore.client import Config  # pylint: disable=import-outside-toplevel
+
+                _s3_client = boto3.client(
+                    "s3",
+                    config=Config(
+                        signature_version="s3v4",
+                        max_pool_connections=current_app.config["S3_MAX_POOL_CONNECTIONS"],
+                        tcp_keepalive=True,
+                        retries={"max_attempts": 3, "mode": "standard"},
+                    ),
+                    region_name=current_app.config["AWS_REGION"],
+                )
+                instrument_s3_client(_s3_client)
+    return _s3_client
+
+def reset_s3():
+    """Forget the S3 client; a client inherited across fork must not be reused."""
+    global _s3_client
+    _s3_client = None
+
+def object_exists(key: str) -> bool:
+    from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
+
+    try:
+        get_s3().head_object(Bucket=current_app.config["S3_BUCKET_NAME"], Key=key)
+    except ClientError:
+        return False
+    return True
+
+def download_object(key: str, fileobj) -> bool:
+    from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
+
+    try:
+        get_s3().download_fileobj(current_app.config["S3_BUCKET_NAME"], key, fileobj)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            return False
+        raise
+    return True
+
+class PresignedUrlCache:
+    """Hands out one presigned GET URL per key per signing window.
+
+    Windows are aligned to wall-clock multiples of ``window`` seconds. A URL is
+    signed for two windows, so whatever is handed out stays valid for at least
+    one full window after its cache entry expires.
+    """
+
+    def __init__(self, window: int, max_entries: int):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        with observe_s3("PresignGetObject"):
+            url = get_s3().generate_presigned_url(
+                "get_object",
+                Params={
+                    "Bucket": current_app.config["S3_BUCKET_NAME"],
+                    "Key": key,
+                    "ResponseCacheControl": f"private, max-age={self.window}",
+                },
+                ExpiresIn=2 * self.window,
+            )
+        window_end = now - now % self.window + self.window
+
+        with self._lock:
+            self._entries[key] = (url, window_end)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+        return url
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self, now: float):
+        expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+_url_cache = None
+
+def presigned_url(key: str) -> str:
+    global _url_cache
+    if _url_cache is None:
+        with _s3_lock:
+            if _url_cache is None:
+                _url_cache = PresignedUrlCache(
+                    current_app.config["S3_PRESIGN_WINDOW"],
+                    current_app.config["S3_PRESIGN_CACHE_SIZE"],
+                )
+    return _url_cache.get(key)
+
+def forget_presigned_url(key: str):
+    if _url_cache is not None:
+        _url_cache.discard(key)
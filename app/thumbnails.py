@@ -0,0 +1,80 @@
+import io
+from pathlib import PurePosixPath
+from flask import current_app
+from . import db
+from .jobs import enqueue, job_handler, jobs_cli
+from .models import Image
+from .storage import get_s3, presigned_url
+
+THUMBNAIL_JOB = "thumbnail"
+
+def thumbnail_key(stored_filename: str, width: int) -> str:
+    return f"thumbs/{PurePosixPath(stored_filename).stem}_{width}.webp"
+
+def enqueue_thumbnails(image: Image):
+    enqueue(THUMBNAIL_JOB, image_id=image.id)
+
+def image_sources(image: Image):
+    """Return ``(src, srcset)`` for the feed, preferring generated thumbnails."""
+    keys = image.thumbnail_keys
+    if not keys:
+        return presigned_url(image.stored_filename), None
+    widths = sorted(keys, key=int)
+    srcset = ", ".join(f"{presigned_url(keys[w])} {w}w" for w in widths)
+    return presigned_url(keys[widths[0]]), srcset
+
+def render_thumbnails(original: bytes, widths):
+    from PIL import Image as PILImage, ImageOps  # pylint: disable=import-outside-toplevel
+
+    with PILImage.open(io.BytesIO(original)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+        for width in widths:
+            resized = source.copy()
+            resized.thumbnail((width, width * 4))
+            out = io.BytesIO()
+            resized.save(out, "WEBP", quality=current_app.config["THUMBNAIL_QUALITY"], method=4)
+            yield width, out.getvalue()
+
+@job_handler(THUMBNAIL_JOB)
+def generate_thumbnails(payloads):
+    s3 = get_s3()
+    bucket = current_app.config["S3_BUCKET_NAME"]
+    for payload in payloads:
+        image = db.session.get(Image, payload["image_id"])
+        if image is None or image.thumbnail_keys:
+            continue
+
+        twin = Image.query.filter(
+            Image.stored_filename == image.stored_filename, Image.thumbnail_keys.isnot(None)
+        ).first()
+        if twin is not None:
+            image.thumbnail_keys = twin.thumbnail_keys
+            image.version = Image.version + 1
+            continue
+
+        original = s3.get_object(Bucket=bucket, Key=image.stored_filename)["Body"].read()
+        keys = {}
+        for width, data in render_thumbnails(original, current_app.config["THUMBNAIL_WIDTHS"]):
+            key = thumbnail_key(image.stored_filename, width)
+            s3.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=data,
+                ContentType="image/webp",
+                CacheControl="public, max-age=31536000, immutable",
+            )
+            keys[str(width)] = key
+        image.thumbnail_keys = keys
+        image.version = Image.version + 1
+
+@jobs_cli.command("backfill-thumbnails")
+def backfill_thumbnails():
+    """Queue thumbnail jobs for images that have none yet."""
+    count = 0
+    for (image_id,) in Image.query.with_entities(Image.id).filter(Image.thumbnail_keys.is_(None)):
+        enqueue(THUMBNAIL_JOB, image_id=image_id)
+        count += 1
+    db.session.commit()
+    print(f"Queued {count} thumbnail job(s)")
@@ -0,0 +1,72 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import extract, func
+from sqlalchemy.dialects.postgresql import insert
+from . import db
+from .jobs import jobs_cli
+from .models import LikeBucket
+
+def record_like_event(image_id: int, delta: int, liked_at: datetime):
+    """Count a like, or take back an unlike, in the hour the like was made.
+
+    An unlike of a like that already left the window changes nothing.
+    """
+    if liked_at <= datetime.now(timezone.utc) - timedelta(hours=current_app.config["TRENDING_WINDOW_HOURS"]):
+        return
+    bucket_start = func.date_trunc("hour", liked_at)
+    stmt = insert(LikeBucket).values(image_id=image_id, bucket_start=bucket_start, likes=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LikeBucket.image_id, LikeBucket.bucket_start],
+        set_={"likes": LikeBucket.likes + delta},
+    )
+    db.session.execute(stmt)
+
+class TrendingCache:
+    """In-process top-N of images by recent like velocity.
+
+    Likes add to hourly ``like_buckets`` rows and an unlike is taken back from
+    the bucket of the like it undoes; the ranking sums the buckets of the last
+    TRENDING_WINDOW_HOURS, each halved every TRENDING_HALF_LIFE_HOURS, and is
+    recomputed at most every TRENDING_REFRESH_SECONDS per process. The query
+    only reads the window's buckets, so its cost does not grow with the likes
+    table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._image_ids = []
+        self._next_refresh = 0.0
+
+    def top(self) -> list:
+        if time.monotonic() >= self._next_refresh:
+            with self._lock:
+                if time.monotonic() >= self._next_refresh:
+                    self._image_ids = self._load()
+                    self._next_refresh = time.monotonic() + current_app.config["TRENDING_REFRESH_SECONDS"]
+        return self._image_ids
+
+    def _load(self) -> list:
+        config = current_app.config
+        age_hours = extract("epoch", func.now() - LikeBucket.bucket_start) / 3600
+        score = func.sum(LikeBucket.likes * func.power(0.5, age_hours / config["TRENDING_HALF_LIFE_HOURS"]))
+        rows = (
+            db.session.query(LikeBucket.image_id)
+            .filter(LikeBucket.bucket_start > func.now() - timedelta(hours=config["TRENDING_WINDOW_HOURS"]))
+            .group_by(LikeBucket.image_id)
+            .having(score > 0)
+            .order_by(score.desc(), LikeBucket.image_id.desc())
+            .limit(config["TRENDING_SIZE"])
+        )
+        return [image_id for (image_id,) in rows]
+
+trending = TrendingCache()
+
+@jobs_cli.command("prune-like-buckets")
+def prune_like_buckets():
+    """Delete like buckets that fell out of the trending window."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=current_app.config["TRENDING_WINDOW_HOURS"] + 1)
+    deleted = LikeBucket.query.filter(LikeBucket.bucket_start < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    print(f"Deleted {deleted} old like bucket(s)")
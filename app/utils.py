@@ -1,9 +1,15 @@
+import base64
+import binascii
+import time
+from datetime import datetime
 from pathlib import Path
-from flask import session, redirect, url_for, request
+from flask import session, redirect, url_for, request, current_app
+from sqlalchemy import tuple_
+from .passwords import hasher
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
 
 ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+CONTENT_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
 
 def require_login():
     if not session.get("user_id"):
@@ -23,6 +29,85 @@ def pick_ext(filename: str) -> str:
         raise ValueError("Unsupported file type. Use jpg,jpeg,png,webp")
     return ext
 
+def encode_cursor(created_at, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, binascii.Error):
+        return None
+
+def keyset_page(query, model, cursor, page_size: int):
+    after = decode_cursor(cursor)
+    if after:
+        query = query.filter(tuple_(model.created_at, model.id) < after)
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    raw = f"{rank!r}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_rank_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, row_id = raw.split("|")
+        return float(rank), int(row_id)
+    except (ValueError, binascii.Error):
+        return None
+
+def ranked_page(query, model, rank, cursor, page_size: int):
+    """Like ``keyset_page`` but ordered by the ``rank`` expression, best first.
+
+    ``rank`` should be double precision: a ``real`` does not survive the
+    round-trip through the cursor exactly and the page boundary would repeat.
+    """
+    after = decode_rank_cursor(cursor)
+    if after:
+        query = query.filter(tuple_(rank, model.id) < after)
+    rows = query.add_columns(rank).order_by(rank.desc(), model.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_rank_cursor(rows[-1][1], rows[-1][0].id)
+    return [row for row, _ in rows], next_cursor
+
+def unlocked_image_ids() -> set:
+    now = time.time()
+    return {int(image_id) for image_id, until in session.get("unlocked", {}).items() if until > now}
+
+def unlock_image(image_id: int):
+    now = int(time.time())
+    unlocked = {key: until for key, until in session.get("unlocked", {}).items() if until > now}
+    unlocked[str(image_id)] = now + current_app.config["UNLOCK_TTL"]
+    limit = current_app.config["UNLOCKED_IMAGES_MAX"]
+    if len(unlocked) > limit:
+        unlocked = dict(sorted(unlocked.items(), key=lambda item: item[1])[-limit:])
+    session["unlocked"] = unlocked
+
+def parse_limits(spec: str) -> dict:
+    """Parse ``endpoint=requests/seconds,...`` into ``{endpoint: (capacity, refill per second)}``."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, rule = item.partition("=")
+        count, _, seconds = rule.partition("/")
+        limits[endpoint.strip()] = (float(count), float(count) / float(seconds))
+    return limits
+
 def get_client_ip():
     ip = request.headers.get("X-Forwarded-For", request.remote_addr)
     if ip and "," in ip:
@@ -40,6 +125,6 @@ def handle_hidden_location(form_data, image):
     image.location_is_hidden = hide_location
     if location_value:
         image.location = location_value
-    image.location_password_hash = generate_password_hash(password) if hide_location else None
+    image.location_password_hash = hasher.hash(password) if hide_location else None
 
     return True
\ No newline at end of file
@@ -0,0 +1,245 @@
+"""Offline load test for PictApp.
+
+Boots create_app() against DATABASE_URL (a throwaway local Postgres database,
+its tables are dropped and re-created) with S3 replaced by an in-process moto
+stand-in, seeds data, drives the endpoints through Flask test clients and
+reports latency percentiles, throughput and SQL queries per request.
+
+    DATABASE_URL=postgresql://localhost/pictapp_bench python -m bench.run --reset
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PASSWORD = "bench-password"
+
+_local = threading.local()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reset", action="store_true", help="Drop and re-create all tables in DATABASE_URL first (required).")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--bans", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--only", action="append", help="Run only the named scenario(s).")
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--latency-tolerance", type=float, default=2.0, help="Allowed p95 slowdown factor vs the baseline.")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run's results as the new baseline.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    return parser.parse_args(argv)
+
+def boot_app():
+    os.environ.setdefault("FLASK_SECRET_KEY", "bench")
+    os.environ.setdefault("AWS_REGION", "eu-north-1")
+    os.environ.setdefault("S3_BUCKET_NAME", "pictapp-bench")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    # The login scenario replays one client far past the auth.login limit.
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "off")
+
+    from moto import mock_aws  # pylint: disable=import-outside-toplevel
+    import boto3  # pylint: disable=import-outside-toplevel
+
+    mock_aws().start()
+    region = os.environ["AWS_REGION"]
+    boto3.client("s3", region_name=region).create_bucket(
+        Bucket=os.environ["S3_BUCKET_NAME"],
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    sys.path.insert(0, str(BENCH_DIR.parent))
+    from app import create_app  # pylint: disable=import-outside-toplevel
+
+    return create_app()
+
+def count_queries(app):
+    from sqlalchemy import event  # pylint: disable=import-outside-toplevel
+    from app import db  # pylint: disable=import-outside-toplevel
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_args):
+        _local.queries = getattr(_local, "queries", 0) + 1
+
+def seed(app, args):
+    from sqlalchemy import insert  # pylint: disable=import-outside-toplevel
+    from werkzeug.security import generate_password_hash  # pylint: disable=import-outside-toplevel
+    from app import db  # pylint: disable=import-outside-toplevel
+    from app.models import Banned, Image, Like, LikeBucket, User  # pylint: disable=import-outside-toplevel
+
+    password_hash = generate_password_hash(PASSWORD, app.config["PASSWORD_HASH_METHOD"])
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [{"username": "admin", "password_hash": password_hash, "last_ip": "127.0.0.1", "is_admin": True}]
+        users += [
+            {
+                "username": f"user{i}",
+                "password_hash": password_hash,
+                "last_ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+                "last_inet": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            }
+            for i in range(args.users)
+        ]
+        db.session.execute(insert(User), users)
+        db.session.execute(
+            insert(Image),
+            [
+                {
+                    "user_id": 2 + i % max(args.users, 1),
+                    "stored_filename": f"bench-{i}.png",
+                    "created_at": start + timedelta(seconds=i),
+                    "description": f"Bench image {i}",
+                    "location": "Kyiv",
+                }
+                for i in range(args.images)
+            ],
+        )
+        if args.images:
+            likes = [{"user_id": 1 + i % (args.users + 1), "image_id": 1 + (i * 7919) % args.images} for i in range(args.likes)]
+            db.session.execute(insert(Like), likes)
+            # Spread the likes over the trending window so /images/trending has a full page.
+            hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            buckets = {}
+            for i, like in enumerate(likes):
+                key = (like["image_id"], hour - timedelta(hours=i % app.config["TRENDING_WINDOW_HOURS"]))
+                buckets[key] = buckets.get(key, 0) + 1
+            db.session.execute(
+                insert(LikeBucket),
+                [{"image_id": image_id, "bucket_start": bucket_start, "likes": n} for (image_id, bucket_start), n in buckets.items()],
+            )
+        db.session.execute(insert(Banned), [{"ip": f"192.0.{i // 256 % 256}.{i % 256}"} for i in range(args.bans)])
+        db.session.commit()
+
+    app.test_cli_runner().invoke(args=["images", "repair-likes-count"])
+    app.test_cli_runner().invoke(args=["images", "repair-images-count"])
+
+def scenarios(app):
+    from app.models import Image  # pylint: disable=import-outside-toplevel
+    from app.utils import encode_cursor  # pylint: disable=import-outside-toplevel
+
+    with app.app_context():
+        last_on_first_page = (
+            Image.query.order_by(Image.created_at.desc(), Image.id.desc())
+            .offset(app.config["IMAGES_PAGE_SIZE"] - 1)
+            .first()
+        )
+        cursor = encode_cursor(last_on_first_page.created_at, last_on_first_page.id) if last_on_first_page else None
+
+    return {
+        "health": ("GET", "/health", None, None),
+        "images_feed": ("GET", "/images", None, "user0"),
+        "images_feed_page2": ("GET", f"/images?cursor={cursor}" if cursor else "/images", None, "user0"),
+        "api_images": ("GET", "/api/images", None, "user0"),
+        "user_gallery": ("GET", "/users/3/images", None, "user0"),
+        "trending": ("GET", "/images/trending", None, "user0"),
+        "login": ("POST", "/login", {"username": "user1", "password": PASSWORD}, None),
+        "admin_index": ("GET", "/admin/", None, "admin"),
+        "admin_ip_search": ("GET", "/admin/?ip=10.0.1", None, "admin"),
+    }
+
+def make_client(app, username):
+    client = app.test_client()
+    if username:
+        response = client.post("/login", data={"username": username, "password": PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f"Could not log in as {username}: {response.status_code}")
+    return client
+
+def run_scenario(app, scenario, args):
+    method, path, data, username = scenario
+    clients = [make_client(app, username) for _ in range(args.concurrency)]
+
+    def one(i):
+        client = clients[i % len(clients)]
+        _local.queries = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        return elapsed, _local.queries
+
+    one(0)
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - wall_started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "rps": round(len(results) / wall, 1),
+        "queries": statistics.median_low(r[1] for r in results),
+    }
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            failures.append(f"{name}: no baseline entry, record one with --update-baseline")
+            continue
+        if result["queries"] > expected["queries"]:
+            failures.append(f"{name}: {result['queries']} queries per request, baseline allows {expected['queries']}")
+        if result["p95_ms"] > expected["p95_ms"] * tolerance:
+            failures.append(f"{name}: p95 {result['p95_ms']}ms exceeds {tolerance}x baseline {expected['p95_ms']}ms")
+    return failures
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.reset:
+        sys.exit("Refusing to run without --reset: the benchmark drops and re-creates every table in DATABASE_URL")
+
+    app = boot_app()
+    seed(app, args)
+    count_queries(app)
+
+    results = {}
+    for name, scenario in scenarios(app).items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = run_scenario(app, scenario, args)
+
+    print(f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>10}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['rps']:>10}{r['queries']:>10}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {baseline_path}")
+        return
+
+    if baseline_path.exists():
+        failures = compare(results, json.loads(baseline_path.read_text()), args.latency_tolerance)
+        if failures:
+            print("\nRegressions against baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+if __name__ == "__main__":
+    main()
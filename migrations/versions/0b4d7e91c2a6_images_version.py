@@ -0,0 +1,26 @@
+"""Images version column for the feed fragment cache
+
+Revision ID: 0b4d7e91c2a6
+Revises: f3c19a7d5e62
+Create Date: 2026-10-18 17:41:09.218346
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b4d7e91c2a6'
+down_revision = 'f3c19a7d5e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_column('version')
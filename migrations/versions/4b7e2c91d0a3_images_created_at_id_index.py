@@ -0,0 +1,26 @@
+"""Composite index for keyset pagination of the image feed
+
+Revision ID: 4b7e2c91d0a3
+Revises: 1dfc718b3512
+Create Date: 2026-10-18 10:12:04.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2c91d0a3'
+down_revision = '1dfc718b3512'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.create_index('ix_images_created_at_id', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_index('ix_images_created_at_id')
@@ -0,0 +1,39 @@
+"""Unique (user_id, image_id) on likes
+
+Revision ID: 5e2a9c4f7b13
+Revises: 0b4d7e91c2a6
+Create Date: 2026-10-18 18:24:51.730462
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2a9c4f7b13'
+down_revision = '0b4d7e91c2a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM likes USING likes AS kept "
+        "WHERE likes.user_id = kept.user_id AND likes.image_id = kept.image_id AND likes.id > kept.id"
+    )
+    op.execute(
+        "UPDATE images SET likes_count = counted.n, version = images.version + 1 "
+        "FROM (SELECT images.id, count(likes.id) AS n FROM images LEFT JOIN likes ON likes.image_id = images.id "
+        "GROUP BY images.id) AS counted "
+        "WHERE counted.id = images.id AND images.likes_count <> counted.n"
+    )
+
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_likes_user_id_image_id', ['user_id', 'image_id'])
+        batch_op.drop_index(batch_op.f('ix_likes_user_id'))
+
+
+def downgrade():
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_likes_user_id'), ['user_id'], unique=False)
+        batch_op.drop_constraint('uq_likes_user_id_image_id', type_='unique')
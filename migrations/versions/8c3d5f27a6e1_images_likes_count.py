@@ -0,0 +1,31 @@
+"""Denormalized likes_count on images
+
+Revision ID: 8c3d5f27a6e1
+Revises: 4b7e2c91d0a3
+Create Date: 2026-10-18 11:03:47.502219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3d5f27a6e1'
+down_revision = '4b7e2c91d0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    op.execute(
+        "UPDATE images SET likes_count = "
+        "(SELECT count(*) FROM likes WHERE likes.image_id = images.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_column('likes_count')
@@ -0,0 +1,29 @@
+"""Full-text search vector on images
+
+Revision ID: 9d3f6b2e8a57
+Revises: 5e2a9c4f7b13
+Create Date: 2026-10-18 19:36:12.584093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6b2e8a57'
+down_revision = '5e2a9c4f7b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("setweight(to_tsvector('simple', coalesce(description, '')), 'A') || setweight(to_tsvector('simple', CASE WHEN location_is_hidden THEN '' ELSE coalesce(location, '') END), 'B')", persisted=True), nullable=True))
+        batch_op.create_index('ix_images_search_vector', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_index('ix_images_search_vector', postgresql_using='gin')
+        batch_op.drop_column('search_vector')
@@ -0,0 +1,29 @@
+"""Like timestamps for trending unlikes
+
+Revision ID: a3d9e5c71b84
+Revises: f1c6b8d24e73
+Create Date: 2026-10-19 10:27:03.664190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d9e5c71b84'
+down_revision = 'f1c6b8d24e73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing likes have no like_buckets row; dating them before any trending
+    # window keeps an unlike of one from booking a negative bucket.
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text("'-infinity'"), nullable=False))
+        batch_op.alter_column('created_at', server_default=sa.text('now()'))
+
+
+def downgrade():
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
@@ -0,0 +1,28 @@
+"""Counters table for cross-process cache versioning
+
+Revision ID: a91f04c6b2d8
+Revises: 8c3d5f27a6e1
+Create Date: 2026-10-18 12:20:15.730946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a91f04c6b2d8'
+down_revision = '8c3d5f27a6e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('counters',
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('counters')
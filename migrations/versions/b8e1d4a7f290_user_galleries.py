@@ -0,0 +1,40 @@
+"""Per-user image counts and gallery index
+
+Revision ID: b8e1d4a7f290
+Revises: 9d3f6b2e8a57
+Create Date: 2026-10-18 20:05:33.914527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1d4a7f290'
+down_revision = '9d3f6b2e8a57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('images_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    op.execute(
+        "UPDATE users SET images_count = counted.n "
+        "FROM (SELECT user_id, count(*) AS n FROM images GROUP BY user_id) AS counted "
+        "WHERE counted.user_id = users.id"
+    )
+
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.create_index('ix_images_user_id_created_at_id', ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+        batch_op.drop_index(batch_op.f('ix_images_user_id'))
+
+
+def downgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_images_user_id'), ['user_id'], unique=False)
+        batch_op.drop_index('ix_images_user_id_created_at_id')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('images_count')
@@ -0,0 +1,37 @@
+"""Content-addressed blobs for upload deduplication
+
+Revision ID: c4a8e2f16d35
+Revises: b8e1d4a7f290
+Create Date: 2026-10-18 20:48:17.306291
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f16d35'
+down_revision = 'b8e1d4a7f290'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('sha256', sa.Text(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    sa.UniqueConstraint('sha256')
+    )
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_constraint('images_stored_filename_key', type_='unique')
+        batch_op.create_index(batch_op.f('ix_images_stored_filename'), ['stored_filename'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_images_stored_filename'))
+        batch_op.create_unique_constraint('images_stored_filename_key', ['stored_filename'])
+
+    op.drop_table('blobs')
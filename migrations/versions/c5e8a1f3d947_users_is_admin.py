@@ -0,0 +1,28 @@
+"""Role flag on users
+
+Revision ID: c5e8a1f3d947
+Revises: a91f04c6b2d8
+Create Date: 2026-10-18 13:05:52.614007
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8a1f3d947'
+down_revision = 'a91f04c6b2d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+    op.execute("UPDATE users SET is_admin = true WHERE username = 'admin'")
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('is_admin')
@@ -0,0 +1,34 @@
+"""Rate limit buckets table
+
+Revision ID: d7f3a9c51e08
+Revises: c4a8e2f16d35
+Create Date: 2026-10-18 21:27:40.662815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f3a9c51e08'
+down_revision = 'c4a8e2f16d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_limits',
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    with op.batch_alter_table('rate_limits', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_rate_limits_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rate_limits', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_rate_limits_updated_at'))
+
+    op.drop_table('rate_limits')
@@ -0,0 +1,57 @@
+"""Indexed IP search on users
+
+Revision ID: e6a3c2d8b190
+Revises: d2b7f9e0a415
+Create Date: 2026-10-18 15:12:40.917326
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a3c2d8b190'
+down_revision = 'd2b7f9e0a415'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_inet', postgresql.INET(), nullable=True))
+        batch_op.create_index('ix_users_last_ip_pattern', ['last_ip'], unique=False, postgresql_ops={'last_ip': 'text_pattern_ops'})
+        batch_op.create_index('ix_users_last_inet', ['last_inet'], unique=False, postgresql_using='gist', postgresql_ops={'last_inet': 'inet_ops'})
+
+    # Set-based backfill; values that are not a bare address stay NULL, and
+    # IPv4-mapped IPv6 becomes plain IPv4 as in bans.parse_address at login.
+    op.execute("""
+        CREATE FUNCTION pg_temp.try_inet(value text) RETURNS inet AS $$
+        BEGIN
+            RETURN value::inet;
+        EXCEPTION WHEN invalid_text_representation THEN
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        UPDATE users SET last_inet = CASE
+            WHEN parsed_ips.address << '::ffff:0.0.0.0/96'::inet
+                THEN '0.0.0.0'::inet + (parsed_ips.address - '::ffff:0.0.0.0'::inet)
+            ELSE parsed_ips.address
+        END
+        FROM (
+            SELECT id, pg_temp.try_inet(btrim(last_ip)) AS address
+            FROM users
+            WHERE last_ip IS NOT NULL AND strpos(last_ip, '/') = 0
+        ) AS parsed_ips
+        WHERE users.id = parsed_ips.id AND parsed_ips.address IS NOT NULL
+    """)
+    op.execute("DROP FUNCTION pg_temp.try_inet(text)")
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_last_inet')
+        batch_op.drop_index('ix_users_last_ip_pattern')
+        batch_op.drop_column('last_inet')
@@ -0,0 +1,34 @@
+"""Hourly like buckets for trending images
+
+Revision ID: e9b5c3d72f41
+Revises: d7f3a9c51e08
+Create Date: 2026-10-18 22:03:58.140627
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b5c3d72f41'
+down_revision = 'd7f3a9c51e08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('like_buckets',
+    sa.Column('image_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('likes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('image_id', 'bucket_start')
+    )
+    with op.batch_alter_table('like_buckets', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_like_buckets_bucket_start'), ['bucket_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('like_buckets', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_like_buckets_bucket_start'))
+
+    op.drop_table('like_buckets')
@@ -0,0 +1,31 @@
+"""Track direct uploads in blobs
+
+Revision ID: f1c6b8d24e73
+Revises: e9b5c3d72f41
+Create Date: 2026-10-19 09:41:26.518034
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6b8d24e73'
+down_revision = 'e9b5c3d72f41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.alter_column('sha256',
+               existing_type=sa.TEXT(),
+               nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM blobs WHERE sha256 IS NULL")
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.alter_column('sha256',
+               existing_type=sa.TEXT(),
+               nullable=False)
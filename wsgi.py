@@ -0,0 +1,8 @@
+import time
+
+started = time.perf_counter()
+
+from app import create_app, report_startup  # pylint: disable=wrong-import-position
+
+app = create_app(migrations=False)
+report_startup(app, started)